@@ -1,15 +1,51 @@
 #!/usr/bin/env python
 
 import asyncio
-import base64
+import concurrent.futures
 import json
+import logging
+import orjson
 import os
 import pyaudio
+import pybase64
 import websockets
 from websockets.exceptions import ConnectionClosed
 
+from overflow import OverflowMonitor
+from resample import Decimator
+from session import close_stream, wait_for_enter
+
+logger = logging.getLogger(__name__)
+
 
 class OpenAIRealtimeTranscriber:
+    # The realtime API only accepts audio as base64 inside JSON text frames;
+    # there is no binary frame variant to fall back from. Base64 never needs
+    # JSON escaping, so append events are built by concatenation instead of
+    # running json.dumps over the whole payload.
+    AUDIO_EVENT_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+    AUDIO_EVENT_SUFFIX = '"}'
+
+    __slots__ = (
+        "api_key",
+        "websocket",
+        "audio_format",
+        "channels",
+        "sample_rate",
+        "capture_rate",
+        "chunk_size",
+        "chunks_per_send",
+        "overflow",
+        "audio",
+        "decimate",
+        "stream",
+        "loop",
+        "audio_queue",
+        "input_executor",
+        "running",
+        "event_handlers",
+    )
+
     def __init__(self):
         self.api_key = os.getenv("API_KEY")
         if not self.api_key:
@@ -19,26 +55,45 @@ class OpenAIRealtimeTranscriber:
         self.audio_format = pyaudio.paInt16
         self.channels = 1
         self.sample_rate = 24000  # OpenAI real-time API uses 24kHz
+        self.capture_rate = 48000  # Native rate of most input devices
         self.chunk_size = 1024
+        self.chunks_per_send = 4  # Batch ~170ms of audio per append event
+        # Owns the capture buffer size, grown on repeated input overflows
+        self.overflow = OverflowMonitor(self.chunk_size)
         self.audio = pyaudio.PyAudio()
+        self.decimate = Decimator(self.capture_rate, self.sample_rate)
         self.stream = None
+        self.loop = None
+        self.audio_queue = None
+        self.input_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="stdin"
+        )
         self.running = False
 
+        self.event_handlers = {
+            "session.created": self.on_session_created,
+            "input_audio_buffer.speech_started": self.on_speech_started,
+            "input_audio_buffer.speech_stopped": self.on_speech_stopped,
+            "conversation.item.input_audio_transcription.delta": self.on_transcription_completed,
+            "conversation.item.input_audio_transcription.completed": self.on_transcription_completed,
+            "error": self.on_error,
+        }
+
     async def on_session_created(self, event):
         """Handle session creation - equivalent to on_metadata"""
-        print(f"\n\nSession created: {json.dumps(event, indent=2)}\n\n")
+        logger.debug("session created %s", event)
 
     async def on_speech_started(self, event):
         """Handle speech detection start"""
-        print(f"\n\nSpeech started: {json.dumps(event, indent=2)}\n\n")
+        logger.debug("speech started %s", event)
 
     async def on_speech_stopped(self, event):
         """Handle speech detection stop"""
-        print(f"Speech stopped: {json.dumps(event, indent=2)}")
+        logger.debug("speech stopped %s", event)
 
     async def on_transcription_completed(self, event):
         """Handle completed transcription - equivalent to on_message"""
-        print(f"Handling {event}")
+        logger.debug("handling %s", event)
         text = ""
         is_final = False
         if "transcript" in event:
@@ -60,48 +115,33 @@ class OpenAIRealtimeTranscriber:
 
     async def on_error(self, event):
         """Handle errors"""
-        print(f"Error: {json.dumps(event, indent=2)}")
+        logger.error("error %s", event)
 
     async def handle_server_events(self):
         """Handle incoming events from OpenAI real-time API"""
-        try:
-            async for message in self.websocket:
-                try:
-                    event = json.loads(message)
-                    event_type = event.get("type", "")
-
-                    if event_type == "session.created":
-                        await self.on_session_created(event)
-                    elif event_type == "input_audio_buffer.speech_started":
-                        await self.on_speech_started(event)
-                    elif event_type == "input_audio_buffer.speech_stopped":
-                        await self.on_speech_stopped(event)
-                    elif (
-                        event_type
-                        == "conversation.item.input_audio_transcription.delta"
-                    ):
-                        await self.on_transcription_completed(event)
-                    elif (
-                        event_type
-                        == "conversation.item.input_audio_transcription.completed"
-                    ):
-                        await self.on_transcription_completed(event)
-                    elif event_type == "error":
-                        await self.on_error(event)
-                    else:
-                        pass
-                        # Handle other events if needed
-                        print(f"Received event: {event_type}")
-
-                except json.JSONDecodeError as e:
-                    print(f"Failed to decode message: {e}")
-                except Exception as e:
-                    print(f"Error handling server event: {e}")
-
-        except ConnectionClosed:
-            print("Connection to OpenAI closed")
-        except Exception as e:
-            print(f"Error in handle_server_events: {e}")
+        # A closed connection ends this loop and, through the task group,
+        # the session
+        while True:
+            # Take raw bytes so text frames skip the UTF-8 decode
+            message = await self.websocket.recv(decode=False)
+            try:
+                event = orjson.loads(message)
+            except orjson.JSONDecodeError as e:
+                logger.warning("failed to decode message: %s", e)
+                continue
+
+            # One malformed event must not end event handling
+            try:
+                event_type = event.get("type", "")
+
+                handler = self.event_handlers.get(event_type)
+                if handler:
+                    await handler(event)
+                else:
+                    # Handle other events if needed
+                    logger.debug("event %s", event_type)
+            except Exception as e:
+                logger.exception("error handling server event: %s", e)
 
     async def send_session_config(self):
         """Configure the session for transcription"""
@@ -123,52 +163,64 @@ class OpenAIRealtimeTranscriber:
 
         await self.websocket.send(json.dumps(session_config))
 
+    def on_audio(self, in_data, frame_count, time_info, status):
+        """Hand audio captured by PortAudio over to the event loop"""
+        self.overflow.record(status)
+        audio_data = self.decimate(in_data).tobytes()
+        self.loop.call_soon_threadsafe(self.audio_queue.put_nowait, audio_data)
+        return (None, pyaudio.paContinue)
+
     def start_audio_capture(self):
         """Start capturing audio from microphone"""
+        # A failed reopen must not leave the closed stream behind
+        self.stream = None
         self.stream = self.audio.open(
             format=self.audio_format,
             channels=self.channels,
-            rate=self.sample_rate,
+            rate=self.capture_rate,
             input=True,
-            frames_per_buffer=self.chunk_size,
+            frames_per_buffer=self.overflow.frames_per_buffer * self.decimate.factor,
+            stream_callback=self.on_audio,
         )
 
     async def stream_audio(self):
         """Capture and stream audio to OpenAI"""
+        self.loop = asyncio.get_running_loop()
+        self.audio_queue = asyncio.Queue()
         self.start_audio_capture()
+        audio_data = bytearray()
+        # Resolve everything the loop touches once per session. Batches are
+        # sized in bytes since the capture buffer may grow mid-session.
+        batch_size = (
+            self.chunks_per_send
+            * self.chunk_size
+            * self.audio.get_sample_size(self.audio_format)
+        )
+        next_chunk = self.audio_queue.get
+        send = self.websocket.send
 
         try:
             while self.running:
+                # Collect a batch of audio chunks from the capture callback
+                audio_data.clear()
+                while len(audio_data) < batch_size:
+                    audio_data += await next_chunk()
+
+                # Send base64 encoded audio data to OpenAI
                 try:
-                    # Read audio data
-                    audio_data = self.stream.read(
-                        self.chunk_size, exception_on_overflow=False
+                    await send(
+                        self.AUDIO_EVENT_PREFIX
+                        + pybase64.b64encode_as_string(audio_data)
+                        + self.AUDIO_EVENT_SUFFIX
                     )
+                except ConnectionClosed as e:
+                    logger.error("error streaming audio: %s", e)
+                    raise
 
-                    # Encode audio data as base64
-                    audio_base64 = base64.b64encode(audio_data).decode("utf-8")
+                await self.overflow.check(self.stream, self.start_audio_capture)
 
-                    # Send audio data to OpenAI
-                    audio_event = {
-                        "type": "input_audio_buffer.append",
-                        "audio": audio_base64,
-                    }
-
-                    await self.websocket.send(json.dumps(audio_event))
-
-                    # Small delay to prevent overwhelming the API
-                    await asyncio.sleep(0.01)
-
-                except Exception as e:
-                    print(f"Error streaming audio: {e}")
-                    break
-
-        except Exception as e:
-            print(f"Error in audio streaming: {e}")
         finally:
-            if self.stream:
-                self.stream.stop_stream()
-                self.stream.close()
+            await close_stream(self)
 
     async def connect_and_run(self):
         """Main connection and run loop"""
@@ -179,7 +231,18 @@ class OpenAIRealtimeTranscriber:
         }
 
         try:
-            async with websockets.connect(url, additional_headers=headers) as websocket:
+            async with websockets.connect(
+                url,
+                additional_headers=headers,
+                # Events come from OpenAI, no need to cap their size
+                max_size=None,
+                # Let a few batches queue up before send() waits on the network
+                write_limit=2**20,
+                ping_interval=20,
+                ping_timeout=20,
+                # Base64 audio barely compresses, skip deflating it
+                compression=None,
+            ) as websocket:
                 self.websocket = websocket
 
                 # Configure the session
@@ -187,41 +250,35 @@ class OpenAIRealtimeTranscriber:
 
                 self.running = True
 
-                # Start audio streaming and event handling concurrently
-                audio_task = asyncio.create_task(self.stream_audio())
-                events_task = asyncio.create_task(self.handle_server_events())
-
-                # Wait for user input in a non-blocking way
-                def check_input():
-                    try:
-                        input("Press Enter to stop recording...\n\n")
-                        return True
-                    except:
-                        return False
-
-                # Run until user presses Enter
-                loop = asyncio.get_event_loop()
-                await loop.run_in_executor(None, check_input)
-
-                self.running = False
-
-                # Cancel tasks
-                audio_task.cancel()
-                events_task.cancel()
-
-                try:
-                    await audio_task
-                except asyncio.CancelledError:
-                    pass
+                loop = asyncio.get_running_loop()
 
+                # Stream audio and handle events concurrently. If either one
+                # fails the task group cancels the other and the Enter wait.
                 try:
-                    await events_task
-                except asyncio.CancelledError:
-                    pass
+                    async with asyncio.TaskGroup() as tg:
+                        audio_task = tg.create_task(self.stream_audio())
+                        events_task = tg.create_task(self.handle_server_events())
+
+                        # Run until user presses Enter
+                        await loop.run_in_executor(
+                            self.input_executor,
+                            wait_for_enter,
+                            lambda: self.running,
+                            "Press Enter to stop recording...\n\n",
+                        )
+
+                        self.running = False
+                        audio_task.cancel()
+                        events_task.cancel()
+                except* ConnectionClosed as eg:
+                    # The server ending the session is not a crash
+                    logger.info("connection to OpenAI closed: %s", eg.exceptions[0])
 
         except Exception as e:
-            print(f"Connection error: {e}")
+            logger.exception("connection error: %s", e)
         finally:
+            self.running = False
+            self.input_executor.shutdown(wait=False)
             if self.audio:
                 self.audio.terminate()
 
@@ -232,8 +289,9 @@ async def main():
         transcriber = OpenAIRealtimeTranscriber()
         await transcriber.connect_and_run()
     except Exception as e:
-        print(f"Error: {e}")
+        logger.exception("error: %s", e)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
     asyncio.run(main())
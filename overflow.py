@@ -0,0 +1,90 @@
+import asyncio
+import collections
+import logging
+import time
+
+import pyaudio
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowMonitor:
+    """Track PortAudio input overflows and decide when to grow the buffer.
+
+    Overflows are recorded from the PortAudio callback thread. The buffer
+    only doubles when OVERFLOWS of them land within WINDOW seconds, so a
+    few overruns spread over a long session leave it, and the latency it
+    adds, alone. Once it has grown, check() reopens the input stream off
+    the event loop so the new size takes effect.
+    """
+
+    __slots__ = (
+        "frames_per_buffer",
+        "max_frames_per_buffer",
+        "window",
+        "recent",
+        "total",
+        "reported",
+        "reopening",
+    )
+
+    def __init__(
+        self, frames_per_buffer, max_frames_per_buffer=8192, overflows=3, window=10.0
+    ):
+        self.frames_per_buffer = frames_per_buffer
+        self.max_frames_per_buffer = max_frames_per_buffer
+        self.window = window
+        self.recent = collections.deque(maxlen=overflows)
+        self.total = 0
+        self.reported = 0
+        self.reopening = None
+
+    def record(self, status):
+        """Note an overflow if the callback STATUS flags carry one"""
+        if status & pyaudio.paInputOverflow:
+            self.recent.append(time.monotonic())
+            self.total += 1
+
+    def grow(self):
+        """Return a larger buffer size if overflows keep happening, else None"""
+        if self.total > self.reported:
+            self.reported = self.total
+            logger.warning("input overflowed %d times so far", self.total)
+
+        recent = list(self.recent)
+        if len(recent) < self.recent.maxlen or recent[-1] - recent[0] > self.window:
+            return None
+
+        self.recent.clear()
+        if self.frames_per_buffer >= self.max_frames_per_buffer:
+            return None
+
+        self.frames_per_buffer = min(
+            self.frames_per_buffer * 2, self.max_frames_per_buffer
+        )
+        logger.warning(
+            "reopening input stream with %d frames per buffer", self.frames_per_buffer
+        )
+        return self.frames_per_buffer
+
+    @staticmethod
+    def reopen(stream, start):
+        """Close STREAM and call START to open it again at the new size"""
+        stream.stop_stream()
+        stream.close()
+        start()
+
+    async def check(self, stream, start):
+        """Reopen STREAM through START if the buffer had to grow"""
+        if self.grow():
+            # Closing and opening the device blocks, keep it off the loop.
+            # A cancel must not abandon the thread while it swaps streams.
+            self.reopening = asyncio.get_running_loop().run_in_executor(
+                None, self.reopen, stream, start
+            )
+            await asyncio.shield(self.reopening)
+
+    async def settle(self):
+        """Wait for a reopen that was cancelled to finish swapping streams"""
+        if self.reopening and not self.reopening.done():
+            await asyncio.wait([self.reopening])
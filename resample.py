@@ -0,0 +1,49 @@
+import numpy as np
+from scipy import signal
+
+
+class Decimator:
+    """Downsample a stream of int16 PCM chunks by an integer factor.
+
+    Equal rates pass chunks through untouched. Otherwise the anti-aliasing
+    filter state is carried across calls, so chunk boundaries do not
+    introduce clicks the way resampling each chunk on its own would.
+    """
+
+    __slots__ = ("factor", "taps", "zi", "offset")
+
+    def __init__(self, input_rate, output_rate, attenuation=65, passband=0.8):
+        if input_rate % output_rate:
+            raise ValueError(
+                f"Cannot decimate {input_rate}Hz to {output_rate}Hz by an integer factor"
+            )
+
+        self.factor = input_rate // output_rate
+        if self.factor == 1:
+            return
+
+        # Pass up to PASSBAND of the new Nyquist and reach full ATTENUATION
+        # by the new Nyquist itself, so nothing just above it aliases back
+        nyquist = 1.0 / self.factor
+        width = (1.0 - passband) * nyquist
+        numtaps, beta = signal.kaiserord(attenuation, width)
+        numtaps |= 1  # Odd length keeps the delay a whole sample
+        self.taps = signal.firwin(numtaps, nyquist - width / 2, window=("kaiser", beta))
+        self.zi = np.zeros(numtaps - 1)
+        self.offset = 0
+
+    def __call__(self, data):
+        """Return DATA, raw int16 PCM bytes, decimated as an int16 array"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        if self.factor == 1:
+            return samples
+
+        filtered, self.zi = signal.lfilter(self.taps, 1.0, samples, zi=self.zi)
+
+        # Keep every factor-th sample of the whole stream, not of each chunk
+        start = -self.offset % self.factor
+        self.offset = (self.offset + len(samples)) % self.factor
+
+        return np.clip(np.rint(filtered[start :: self.factor]), -32768, 32767).astype(
+            np.int16
+        )
@@ -0,0 +1,35 @@
+import os
+import select
+import sys
+
+
+def wait_for_enter(running, prompt=""):
+    """Block until Enter is pressed or RUNNING() turns false.
+
+    Meant to run in a thread next to a session on the event loop. Returns
+    True if Enter was pressed.
+    """
+    if os.name != "posix":
+        # select only accepts sockets on Windows
+        try:
+            input(prompt)
+            return True
+        except EOFError:
+            return False
+
+    # Poll stdin so the thread also exits when the session ends on its own
+    print(prompt, end="", flush=True)
+    while running():
+        if select.select([sys.stdin], [], [], 0.5)[0]:
+            sys.stdin.readline()
+            return True
+    return False
+
+
+async def close_stream(owner):
+    """Close the input stream of transcriber OWNER after any reopen of it"""
+    # Let a cancelled reopen finish so the stream closed is the live one
+    await owner.overflow.settle()
+    if owner.stream:
+        owner.stream.stop_stream()
+        owner.stream.close()
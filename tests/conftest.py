@@ -0,0 +1,39 @@
+import sys
+
+import pytest
+
+
+class FakeAudio:
+    """Stand in for pyaudio.PyAudio, which needs a sound device"""
+
+    def get_sample_size(self, fmt):
+        return 2
+
+    def terminate(self):
+        pass
+
+
+class FakeClient:
+    """Stand in for the OpenAI client"""
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def make_transcriber(monkeypatch):
+    """Build a transcriber through its own __init__ on fake audio and API"""
+    pyaudio = pytest.importorskip("pyaudio")
+    monkeypatch.setenv("API_KEY", "test")
+
+    def make(cls, audio=None):
+        monkeypatch.setattr(pyaudio, "PyAudio", lambda: audio or FakeAudio())
+        module = sys.modules[cls.__module__]
+        if hasattr(module, "AsyncOpenAI"):
+            monkeypatch.setattr(module, "AsyncOpenAI", FakeClient)
+        return cls()
+
+    return make
@@ -0,0 +1,155 @@
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import threading
+
+import pytest
+
+pyaudio = pytest.importorskip("pyaudio")
+
+from websockets.exceptions import ConnectionClosedOK
+from websockets.frames import Close
+
+import openai_realtime_api
+from openai_realtime_api import OpenAIRealtimeTranscriber
+
+
+class FakeStream:
+    def __init__(self):
+        self.closed = False
+        self.stops = 0
+
+    def stop_stream(self):
+        if self.closed:
+            raise OSError("Stream closed")
+        self.stops += 1
+
+    def close(self):
+        self.closed = True
+
+
+class OverflowingAudio:
+    """Overflow on the first stream, pass every later open to reopen()"""
+
+    def __init__(self):
+        self.streams = []
+
+    def get_sample_size(self, fmt):
+        return 2
+
+    def open(self, frames_per_buffer, stream_callback, **kwargs):
+        if self.streams:
+            self.reopen()
+        else:
+            data = b"\0\0" * frames_per_buffer
+            for _ in range(3):
+                stream_callback(data, frames_per_buffer, None, pyaudio.paInputOverflow)
+        self.streams.append(FakeStream())
+        return self.streams[-1]
+
+    def reopen(self):
+        pass
+
+    def terminate(self):
+        pass
+
+
+class SlowReopenAudio(OverflowingAudio):
+    """Open every stream after the first slowly"""
+
+    def __init__(self):
+        super().__init__()
+        self.reopening = threading.Event()
+        self.release = threading.Event()
+
+    def reopen(self):
+        self.reopening.set()
+        self.release.wait(5)
+
+
+class FailingReopenAudio(OverflowingAudio):
+    """Refuse to open any stream after the first"""
+
+    def reopen(self):
+        raise OSError("Invalid sample rate")
+
+
+class FakeWebSocket:
+    async def send(self, message):
+        pass
+
+
+class ClosingWebSocket(FakeWebSocket):
+    """Server that ends the session with a normal close"""
+
+    async def recv(self, decode=True):
+        await asyncio.sleep(0.05)
+        raise ConnectionClosedOK(Close(1000, ""), Close(1000, ""), True)
+
+
+@pytest.fixture
+def streaming(make_transcriber):
+    """Build a transcriber set up as connect_and_run leaves it for streaming"""
+
+    def make(audio):
+        transcriber = make_transcriber(OpenAIRealtimeTranscriber, audio)
+        transcriber.chunks_per_send = 1  # Send as soon as two chunks are in
+        transcriber.websocket = FakeWebSocket()
+        transcriber.running = True
+        return transcriber
+
+    return make
+
+
+async def run_cancel_during_reopen(audio, transcriber):
+    task = asyncio.create_task(transcriber.stream_audio())
+    await asyncio.get_running_loop().run_in_executor(None, audio.reopening.wait, 5)
+
+    task.cancel()
+    await asyncio.sleep(0.05)
+    audio.release.set()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_cancel_during_reopen_closes_live_stream(streaming):
+    audio = SlowReopenAudio()
+    transcriber = streaming(audio)
+
+    asyncio.run(run_cancel_during_reopen(audio, transcriber))
+
+    assert len(audio.streams) == 2
+    assert all(stream.closed and stream.stops == 1 for stream in audio.streams)
+
+
+def test_failed_reopen_raises_its_own_error(streaming):
+    audio = FailingReopenAudio()
+    transcriber = streaming(audio)
+
+    with pytest.raises(OSError, match="Invalid sample rate"):
+        asyncio.run(transcriber.stream_audio())
+
+    assert transcriber.stream is None
+    assert len(audio.streams) == 1
+    assert audio.streams[0].closed and audio.streams[0].stops == 1
+
+
+def test_server_close_ends_session_without_error(make_transcriber, monkeypatch, caplog):
+    transcriber = make_transcriber(OpenAIRealtimeTranscriber, OverflowingAudio())
+
+    @contextlib.asynccontextmanager
+    async def connect(url, **kwargs):
+        yield ClosingWebSocket()
+
+    monkeypatch.setattr(openai_realtime_api.websockets, "connect", connect)
+    # Stdin that never has a line, so only the server can end the session
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(read_fd) as stdin, os.fdopen(write_fd):
+        monkeypatch.setattr(sys, "stdin", stdin)
+        with caplog.at_level(logging.INFO):
+            asyncio.run(transcriber.connect_and_run())
+
+    assert "connection to OpenAI closed" in caplog.text
+    assert not [r for r in caplog.records if r.levelno >= logging.ERROR]
@@ -0,0 +1,28 @@
+import pytest
+
+pyaudio = pytest.importorskip("pyaudio")
+
+import overflow
+from overflow import OverflowMonitor
+
+
+def test_grows_only_on_overflows_within_window(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(overflow.time, "monotonic", lambda: now[0])
+    monitor = OverflowMonitor(1024, max_frames_per_buffer=2048, window=10.0)
+
+    # Spread out overflows leave the buffer alone
+    for now[0] in [0.0, 20.0, 40.0]:
+        monitor.record(pyaudio.paInputOverflow)
+    assert monitor.grow() is None
+
+    for now[0] in [41.0, 42.0]:
+        monitor.record(pyaudio.paInputOverflow)
+    monitor.record(0)
+    assert monitor.grow() == 2048
+
+    # Capped at max_frames_per_buffer
+    for now[0] in [43.0, 44.0, 45.0]:
+        monitor.record(pyaudio.paInputOverflow)
+    assert monitor.grow() is None
+    assert monitor.frames_per_buffer == 2048
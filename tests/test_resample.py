@@ -0,0 +1,26 @@
+import numpy as np
+
+from resample import Decimator
+
+
+def test_chunked_matches_whole_stream():
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-20000, 20000, 48000, dtype=np.int16)
+
+    whole = Decimator(48000, 16000)(samples.tobytes())
+
+    # Odd sizes so chunks start at every phase of the decimation factor
+    decimate = Decimator(48000, 16000)
+    chunks, start = [], 0
+    for size in [1, 2, 1000, 1024, 4097, 3]:
+        chunks.append(decimate(samples[start : start + size].tobytes()))
+        start += size
+    chunks.append(decimate(samples[start:].tobytes()))
+
+    assert np.array_equal(np.concatenate(chunks), whole)
+    assert len(whole) == 16000
+
+
+def test_equal_rates_pass_through():
+    samples = np.arange(-5, 5, dtype=np.int16)
+    assert np.array_equal(Decimator(24000, 24000)(samples.tobytes()), samples)
@@ -0,0 +1,33 @@
+import os
+import sys
+import threading
+
+import pytest
+
+from session import wait_for_enter
+
+
+@pytest.fixture
+def stdin(monkeypatch):
+    """Replace stdin with a pipe, yielding its write end"""
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(read_fd) as read_end, os.fdopen(write_fd, "w") as write_end:
+        monkeypatch.setattr(sys, "stdin", read_end)
+        yield write_end
+
+
+@pytest.mark.skipif(os.name != "posix", reason="polls stdin with select")
+def test_wait_for_enter_returns_on_enter(stdin):
+    stdin.write("\n")
+    stdin.flush()
+
+    assert wait_for_enter(lambda: True)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="polls stdin with select")
+def test_wait_for_enter_returns_once_stopped(stdin):
+    running = threading.Event()
+    running.set()
+    threading.Timer(0.1, running.clear).start()
+
+    assert not wait_for_enter(running.is_set)
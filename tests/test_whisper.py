@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pyaudio")
+
+from whisper import WhisperTranscriber
+
+
+@pytest.fixture
+def transcriber(make_transcriber):
+    transcriber = make_transcriber(WhisperTranscriber)
+    transcriber._samples_per_record = 5000
+    return transcriber
+
+
+def test_take_chunk_across_mixed_frame_sizes(transcriber):
+    samples = np.arange(12000, dtype=np.int16)
+    start = 0
+    for size in [2048, 2048, 4096, 3808]:
+        transcriber.frames.append(samples[start : start + size])
+        start += size
+
+    first = transcriber.take_chunk()
+    second = transcriber.take_chunk()
+
+    assert np.array_equal(first, samples[:5000])
+    assert np.array_equal(second, samples[5000:10000])
+    assert transcriber.take_chunk() is None
+    assert sum(map(len, transcriber.frames)) == 2000
+
+
+def test_take_chunk_final_flushes_leftover(transcriber):
+    samples = np.arange(7000, dtype=np.int16)
+    transcriber.frames.extend([samples[:4096], samples[4096:]])
+
+    assert np.array_equal(transcriber.take_chunk(), samples[:5000])
+    assert np.array_equal(transcriber.take_chunk(final=True), samples[5000:])
+    assert transcriber.take_chunk(final=True) is None
@@ -1,118 +1,266 @@
 #!/usr/bin/env python
 
+import asyncio
+import collections
+import concurrent.futures
 import io
+import logging
 import os
-import threading
-import wave
+import struct
+import numpy as np
 import pyaudio
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+from overflow import OverflowMonitor
+from resample import Decimator
+from session import close_stream, wait_for_enter
 
 
 class WhisperTranscriber:
+    __slots__ = (
+        "client",
+        "audio_format",
+        "channels",
+        "sample_rate",
+        "capture_rate",
+        "chunk_size",
+        "overflow",
+        "record_seconds",
+        "buffer_seconds",
+        "dispatch_interval",
+        "silence_threshold",
+        "silence_frame_samples",
+        "max_in_flight",
+        "stop_timeout",
+        "in_flight",
+        "input_executor",
+        "audio",
+        "stream",
+        "decimate",
+        "frames",
+        "running",
+        "_samples_per_record",
+        "_wav_header_template",
+    )
+
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.audio_format = pyaudio.paInt16
         self.channels = 1
         self.sample_rate = 16000
+        self.capture_rate = 48000  # Native rate of most input devices
         self.chunk_size = 1024
+        # Let PortAudio prebuffer across callback jitter. The buffer size is
+        # owned by the monitor, which grows it on repeated input overflows.
+        self.overflow = OverflowMonitor(2 * self.chunk_size)
         self.record_seconds = 3  # Process audio in 3-second chunks
+        self.buffer_seconds = 30  # Upper bound on audio waiting to be sent
+        self.dispatch_interval = 1.0  # How often buffered audio is checked
+        self.silence_threshold = 500  # RMS below which a frame is silent
+        self.silence_frame_samples = self.sample_rate * 30 // 1000  # 30ms frames
+        self.max_in_flight = 3  # Whisper requests allowed to overlap
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        self.stop_timeout = 5.0  # How long to wait for transcriptions on stop
+        self.input_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="stdin"
+        )
         self.audio = pyaudio.PyAudio()
+        self.stream = None
+        self.decimate = Decimator(self.capture_rate, self.sample_rate)
+        self.frames = collections.deque(maxlen=self.buffered_frames())
         self.running = False
 
-    def record_chunk(self):
-        """Record a chunk of audio"""
-        stream = self.audio.open(
+        self._samples_per_record = self.sample_rate * self.record_seconds
+
+        # The format never changes, so build the RIFF/WAVE header once and
+        # only patch its two length fields per chunk.
+        sample_width = self.audio.get_sample_size(self.audio_format)
+        self._wav_header_template = (
+            b"RIFF"
+            + b"\x00\x00\x00\x00"
+            + b"WAVEfmt \x10\x00\x00\x00\x01\x00"
+            + struct.pack(
+                "<HIIHH",
+                self.channels,
+                self.sample_rate,
+                self.sample_rate * self.channels * sample_width,
+                self.channels * sample_width,
+                sample_width * 8,
+            )
+            + b"data"
+            + b"\x00\x00\x00\x00"
+        )
+
+    def on_audio(self, in_data, frame_count, time_info, status):
+        """Buffer audio handed over by PortAudio"""
+        self.overflow.record(status)
+        self.frames.append(self.decimate(in_data))
+        return (None, pyaudio.paContinue)
+
+    def start_audio_capture(self):
+        """Start capturing audio from microphone"""
+        # A failed reopen must not leave the closed stream behind
+        self.stream = None
+        # Frames grow with the buffer, keep holding at most buffer_seconds
+        self.frames = collections.deque(self.frames, maxlen=self.buffered_frames())
+        self.stream = self.audio.open(
             format=self.audio_format,
             channels=self.channels,
-            rate=self.sample_rate,
+            rate=self.capture_rate,
             input=True,
-            frames_per_buffer=self.chunk_size,
+            frames_per_buffer=self.overflow.frames_per_buffer * self.decimate.factor,
+            stream_callback=self.on_audio,
         )
 
-        frames = []
-        for _ in range(
-            0, int(self.sample_rate / self.chunk_size * self.record_seconds)
-        ):
-            data = stream.read(self.chunk_size)
-            frames.append(data)
+    def buffered_frames(self):
+        """Number of frames that hold buffer_seconds at the current size"""
+        return self.buffer_seconds * self.sample_rate // self.overflow.frames_per_buffer
 
-        stream.stop_stream()
-        stream.close()
+    def take_chunk(self, final=False):
+        """Take a chunk of audio off the buffer, or with FINAL all that is left"""
+        # Frames differ in size once the buffer has grown, so count samples
+        available = sum(map(len, list(self.frames)))
+        size = available if final else self._samples_per_record
+        if not available or available < size:
+            return None
 
-        return b"".join(frames)
+        # Fill one preallocated buffer instead of joining many small bytes
+        samples = np.empty(size, dtype=np.int16)
+        filled = 0
+        while filled < size:
+            frame = self.frames.popleft()
+            n = min(len(frame), size - filled)
+            samples[filled : filled + n] = frame[:n]
+            if n < len(frame):
+                self.frames.appendleft(frame[n:])
+            filled += n
 
-    def audio_to_wav_bytes(self, audio_data):
-        """Convert raw audio data to WAV bytes"""
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, "wb") as wav_file:
-            wav_file.setnchannels(self.channels)
-            wav_file.setsampwidth(self.audio.get_sample_size(self.audio_format))
-            wav_file.setframerate(self.sample_rate)
-            wav_file.writeframes(audio_data)
+        return samples
+
+    def is_silence(self, samples):
+        """Check if a chunk is too quiet to be worth transcribing"""
+        # Gate per frame so a short word is not averaged away by silence
+        n_frames = len(samples) // self.silence_frame_samples
+        frames = samples[: n_frames * self.silence_frame_samples].reshape(
+            n_frames, self.silence_frame_samples
+        )
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.int32), axis=1))
+        return not np.any(rms >= self.silence_threshold)
+
+    def audio_to_wav_bytes(self, samples):
+        """Convert int16 samples to WAV bytes"""
+        header = bytearray(self._wav_header_template)
+        struct.pack_into("<I", header, 4, 36 + samples.nbytes)
+        struct.pack_into("<I", header, 40, samples.nbytes)
 
+        wav_buffer = io.BytesIO()
+        wav_buffer.write(header)
+        wav_buffer.write(samples)
         wav_buffer.seek(0)
+        wav_buffer.name = "audio.wav"  # Required by the API
         return wav_buffer
 
-    def transcribe_audio(self, audio_data):
+    async def transcribe_audio(self, samples):
         """Transcribe audio using Whisper API"""
         try:
-            wav_bytes = self.audio_to_wav_bytes(audio_data)
-            wav_bytes.name = "audio.wav"  # Required by the API
+            wav_bytes = self.audio_to_wav_bytes(samples)
 
-            response = self.client.audio.transcriptions.create(
-                model="whisper-1", file=wav_bytes, language="en"
-            )
+            async with self.in_flight:
+                response = await self.client.audio.transcriptions.create(
+                    model="whisper-1", file=wav_bytes, language="en"
+                )
 
             return response.text.strip()
         except Exception as e:
             print(f"Transcription error: {e}")
             return ""
 
-    def start_continuous_transcription(self):
+    async def transcription_loop(self):
+        """Dispatch buffered audio for transcription until stopped"""
+        # Transcriptions overlap on the event loop, print them in order
+        pending = collections.deque()
+        try:
+            while self.running:
+                await asyncio.sleep(self.dispatch_interval)
+                await self.overflow.check(self.stream, self.start_audio_capture)
+
+                self.dispatch(self.take_chunk(), pending)
+
+                while pending and pending[0].done():
+                    self.print_transcript(pending.popleft().result())
+
+            # Send off what was recorded since the last full chunk and wait
+            # for everything in flight, so stopping keeps the last words
+            self.dispatch(self.take_chunk(final=True), pending)
+            async with asyncio.timeout(self.stop_timeout):
+                while pending:
+                    self.print_transcript(await pending[0])
+                    pending.popleft()
+        except TimeoutError:
+            print("Timed out waiting for the last transcriptions")
+        finally:
+            # Only reached with tasks left on a timeout or interrupt
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+    def dispatch(self, samples, pending):
+        """Queue SAMPLES for transcription unless there are none or silent"""
+        if samples is not None and not self.is_silence(samples):
+            pending.append(asyncio.create_task(self.transcribe_audio(samples)))
+
+    def print_transcript(self, transcript):
+        """Print a finished transcript"""
+        if transcript:
+            print(f"Transcription: {transcript}")
+
+    async def start_continuous_transcription(self):
         """Start continuous transcription"""
         print("Starting continuous transcription. Press Enter to stop...\n")
         self.running = True
+        self.start_audio_capture()
 
-        def transcription_loop():
-            while self.running:
-                # Record audio chunk
-                audio_data = self.record_chunk()
-
-                # Transcribe it
-                transcript = self.transcribe_audio(audio_data)
+        loop = asyncio.get_running_loop()
 
-                if transcript:
-                    print(f"Transcription: {transcript}")
-
-        # Start transcription in separate thread
-        transcription_thread = threading.Thread(target=transcription_loop)
-        transcription_thread.daemon = True
-        transcription_thread.start()
+        try:
+            # If transcription fails the task group cancels the Enter wait,
+            # and an interrupt cancels transcription before anything closes
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self.transcription_loop())
 
-        # Wait for user input
-        input()
+                await loop.run_in_executor(
+                    self.input_executor, wait_for_enter, lambda: self.running
+                )
 
-        print("Stopping transcription...")
-        self.running = False
-        transcription_thread.join(timeout=5)
+                print("Stopping transcription...")
+                self.running = False
+        finally:
+            self.running = False
+            self.input_executor.shutdown(wait=False)
+            await close_stream(self)
+            await self.client.close()
 
     def cleanup(self):
         """Clean up audio resources"""
         self.audio.terminate()
 
 
-def main():
+async def main():
     transcriber = WhisperTranscriber()
 
     try:
-        transcriber.start_continuous_transcription()
-    except KeyboardInterrupt:
-        print("\nInterrupted by user")
-    except Exception as e:
-        print(f"Error: {e}")
+        await transcriber.start_continuous_transcription()
+    except* Exception as eg:
+        for e in eg.exceptions:
+            print(f"Error: {e}")
     finally:
         transcriber.cleanup()
 
 
 if __name__ == "__main__":
-    main()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nInterrupted by user")